@@ -3,6 +3,7 @@ import pygame
 import pygame_widgets
 from pygame_widgets.button import Button
 import random
+import time
 from typing import Union
 
 
@@ -75,7 +76,7 @@ class SudokuCell:
 
 
 class SudokuGame:
-    def __init__(self, grid: Union[str, np.ndarray] = None):
+    def __init__(self, grid: Union[str, np.ndarray] = None, regions=None):
         pygame.display.set_caption('Sudoku')
 
         self.running = True
@@ -85,6 +86,8 @@ class SudokuGame:
         self.fullscreen = False
 
         self.FPS = 30
+        self.solveTimeout = 2
+        self.regions = regions
 
         self.n = 9
         self.sqrt = int(self.n**0.5)
@@ -149,9 +152,9 @@ class SudokuGame:
 
         self.gridRect = pygame.Rect(self.gridX, self.gridY, self.n*self.unit, self.n*self.unit)
 
-        self.sudoku = Sudoku(grid)
-        self.solution = Sudoku(grid)
-        self.solution.solve()
+        self.sudoku = Sudoku(grid, regions=self.regions)
+        self.solution = Sudoku(grid, regions=self.regions)
+        self.solution.solve(timeout=self.solveTimeout)
 
         self.grid = np.empty((self.n, self.n), dtype=SudokuCell)
         self.boxes = np.empty((self.sqrt, self.sqrt), dtype=pygame.Rect)
@@ -344,13 +347,13 @@ class SudokuGame:
                 cell.draw()
 
     def update_solution(self):
-        self.solution = Sudoku(self.sudoku.grid)
-        self.solution.solve()
+        self.solution = Sudoku(self.sudoku.grid, regions=self.regions)
+        self.solution.solve(timeout=self.solveTimeout)
 
     def update_grid(self, grid):
-        self.sudoku = Sudoku(grid)
-        self.solution = Sudoku(grid)
-        self.solution.solve()
+        self.sudoku = Sudoku(grid, regions=self.regions)
+        self.solution = Sudoku(grid, regions=self.regions)
+        self.solution.solve(timeout=self.solveTimeout)
 
         self.grid = np.empty((self.n, self.n), dtype=SudokuCell)
         self.boxes = np.empty((self.sqrt, self.sqrt), dtype=pygame.Rect)
@@ -375,7 +378,15 @@ class SudokuGame:
         buttonColor = self.buttonStateColorActive if self.writeSup else self.buttonStateColorInactive
         self.update_buttonColor(self.buttonSup, buttonColor)
 
+    def solution_found(self):
+        if self.solution.status != Sudoku.SOLVED:
+            print(f'No solution: grid is {self.solution.status}')
+            return False
+        return True
+
     def buttonAutosolveClick(self):
+        if self.autosolve and not self.solution_found():
+            return
         grid = self.solution if self.autosolve else self.sudoku
 
         for j, row in enumerate(grid.rows):
@@ -391,6 +402,8 @@ class SudokuGame:
         self.buttonAutosolve.text = font.render(text, True, (0, 0, 0))
 
     def buttonCheckClick(self):
+        if not self.solution_found():
+            return
         for j, row in enumerate(self.solution.rows):
             for i, val in enumerate(row):
                 cell = self.grid[j][i]
@@ -535,13 +548,24 @@ class SudokuGame:
 
 
 class Sudoku:
-    def __init__(self, grid: Union[str, np.ndarray] = None, n=None):
+    SOLVED = 'solved'
+    UNSOLVABLE = 'unsolvable'
+    TIMEOUT = 'timed out'
+
+    def __init__(self, grid: Union[str, np.ndarray] = None, n=None, regions=None):
         self.grid = self.get_empty_grid(n) if grid is None else self.get_grid_from_str(grid) if isinstance(grid, str) else grid
         self.rows = np.copy(self.grid)
         self.cols = np.transpose(self.rows)
         self.n = self.grid.shape[0]
         self.sqrt = int(self.n ** 0.5)
-        self.boxs = self.get_boxes()
+        self.regions = self.get_classic_regions(self.n) if regions is None else [list(region) for region in regions]
+        self.regionIdx = self.get_region_idx()
+        self.peers = self.get_peers()
+        self.status = None
+
+    @property
+    def boxs(self):
+        return self.get_boxes()
 
     def get_empty_grid(self, n=None):
         if n is None:
@@ -567,47 +591,73 @@ class Sudoku:
             j = l // n
             if char.isdigit():
                 grid[j][i] = int(char)
-        self.__init__(grid, self.n)
+        self.__init__(grid, self.n, self.regions)
+
+    # Regions are lists of cells (i, j) that may not contain a value twice
+    @staticmethod
+    def get_row_regions(n=9):
+        return [[(i, j) for i in range(n)] for j in range(n)]
+
+    @staticmethod
+    def get_col_regions(n=9):
+        return [[(i, j) for j in range(n)] for i in range(n)]
+
+    @staticmethod
+    def get_box_regions(n=9):
+        sqrt = int(n ** 0.5)
+        return [[(i + k, j + l) for l in range(sqrt) for k in range(sqrt)]
+                for j in range(0, n, sqrt) for i in range(0, n, sqrt)]
+
+    @staticmethod
+    def get_classic_regions(n=9):
+        return Sudoku.get_row_regions(n) + Sudoku.get_col_regions(n) + Sudoku.get_box_regions(n)
+
+    @staticmethod
+    def get_diagonal_regions(n=9):
+        return [[(k, k) for k in range(n)], [(n - 1 - k, k) for k in range(n)]]
+
+    @staticmethod
+    def get_window_regions(n=9):
+        # Windoku: extra boxes separated from each other and the border by 1 cell
+        sqrt = int(n ** 0.5)
+        starts = range(1, n - sqrt + 1, sqrt + 1)
+        return [[(i + k, j + l) for l in range(sqrt) for k in range(sqrt)] for j in starts for i in starts]
+
+    @staticmethod
+    def get_jigsaw_regions(shape):
+        # shape: string or 2D array with the same label for every cell in a jigsaw piece
+        if isinstance(shape, str):
+            n = int(len(shape) ** 0.5)
+            shape = [shape[j*n:(j+1)*n] for j in range(n)]
+        pieces = {}
+        for j, row in enumerate(shape):
+            for i, label in enumerate(row):
+                pieces.setdefault(label, []).append((i, j))
+        n = len(shape)
+        return Sudoku.get_row_regions(n) + Sudoku.get_col_regions(n) + list(pieces.values())
+
+    def get_region_idx(self):
+        return [tuple(j*self.n + i for i, j in region) for region in self.regions]
+
+    def get_peers(self):
+        peers = [set() for _ in range(self.n**2)]
+        for region in self.regionIdx:
+            for c in region:
+                peers[c].update(region)
+        for c, cell_peers in enumerate(peers):
+            cell_peers.discard(c)
+        return [tuple(sorted(cell_peers)) for cell_peers in peers]
 
     def get_boxes(self):
-        self.boxs = np.zeros((self.n, self.n), dtype=int)
-        a, b = 0, 0
-        for j in range(0, self.n, self.sqrt):
-            for i in range(0, self.n, self.sqrt):
-                for l in range(self.sqrt):
-                    for k in range(self.sqrt):
-                        self.boxs[b][a] = self.grid[j+l][i+k]
-                        a += 1
-                a = 0
-                b += 1
-        return self.boxs
-
-    def get_box_idx(self, cell):
-        i, j = cell
-        ai, bi = divmod(i, self.sqrt)
-        aj, bj = divmod(j, self.sqrt)
-        l = ai + self.sqrt * aj
-        k = bi + self.sqrt * bj
-        return k, l
+        return self.rows.reshape(self.sqrt, self.sqrt, self.sqrt, self.sqrt).swapaxes(1, 2).reshape(self.n, self.n)
 
     def set_cell_1(self, cell, num):
         i, j = cell
-        i -= 1
-        j -= 1
-        ai, bi = divmod(i, self.sqrt)
-        aj, bj = divmod(j, self.sqrt)
-        l = ai + self.sqrt * aj
-        k = bi + self.sqrt * bj
-        self.rows[j][i] = num
-        self.cols[i][j] = num
-        self.boxs[l][k] = num
+        self.set_cell((i - 1, j - 1), num)
 
     def set_cell(self, cell, num):
         i, j = cell
-        k, l = self.get_box_idx(cell)
         self.rows[j][i] = num
-        self.cols[i][j] = num
-        self.boxs[l][k] = num
 
     def set_grid_cell(self, cell, num):
         self.set_cell(cell, num)
@@ -616,10 +666,7 @@ class Sudoku:
 
     def cell_plus_1(self, cell):
         i, j = cell
-        k, l = self.get_box_idx(cell)
         self.rows[j][i] += 1
-        self.cols[i][j] += 1
-        self.boxs[l][k] += 1
 
     def check_group(self, group):
         numbers = set()
@@ -637,37 +684,80 @@ class Sudoku:
         return True
 
     def check(self):
-        for ordening in (self.rows, self.cols, self.boxs):
-            if not self.check_ordening(ordening):
-                return False
-        return True
+        cells = self.rows.ravel().tolist()
+        return self.check_ordening([cells[c] for c in region] for region in self.regionIdx)
 
     def check_cell(self, cell):
         i, j = cell
-        k, l = self.get_box_idx(cell)
-        return self.check_group(self.rows[j]) and self.check_group(self.cols[i]) and self.check_group(self.boxs[l])
-
-    def solve(self):
-        assert self.check, 'Insert valid grid.'
-        c = 0
-        step = +1
-        while c < self.n**2:
-            j, i = divmod(c, self.n)
-            if not self.grid[j][i]:
-                val = self.rows[j][i]
-                by_sudoku = False
-                while not by_sudoku and val < self.n:
-                    val += 1
-                    self.set_cell((i, j), val)
-                    by_sudoku = self.check_cell((i, j))
-
-                if not by_sudoku and val == self.n:
-                    self.set_cell((i, j), 0)
-                    step = -1
-                else:
-                    step = +1
-            c += step
-        return self.rows
+        val = self.rows[j][i]
+        if not val:
+            return True
+        cells = self.rows.ravel()
+        return all(cells[p] != val for p in self.peers[j*self.n + i])
+
+    def propagate(self):
+        # fill in cells with only 1 possible value, False on a contradiction
+        cells = self.rows.ravel().tolist()
+        values = set(range(1, self.n + 1))
+        valid = True
+        changed = True
+        while valid and changed:
+            changed = False
+            for c, val in enumerate(cells):
+                if val:
+                    continue
+                candidates = values.difference([cells[p] for p in self.peers[c]])
+                if not candidates:
+                    valid = False
+                    break
+                if len(candidates) == 1:
+                    cells[c] = candidates.pop()
+                    changed = True
+        self.set_rows(np.reshape(cells, (self.n, self.n)))
+        return valid
+
+    def set_rows(self, rows):
+        self.rows[:] = rows
+
+    def solve(self, timeout=None, max_nodes=None):
+        start = np.copy(self.rows)
+        if not self.check() or not self.propagate():
+            self.set_rows(start)
+            self.status = self.UNSOLVABLE
+            return self.status
+
+        t_end = None if timeout is None else time.perf_counter() + timeout
+        cells = self.rows.ravel().tolist()
+        empty = [c for c, val in enumerate(cells) if not val]
+        peers = self.peers
+        nodes = 0
+        e = 0
+        while e < len(empty):
+            if e < 0:
+                self.set_rows(start)
+                self.status = self.UNSOLVABLE
+                return self.status
+            nodes += 1
+            if (max_nodes is not None and nodes > max_nodes) or (t_end is not None and time.perf_counter() > t_end):
+                self.set_rows(start)
+                self.status = self.TIMEOUT
+                return self.status
+
+            c = empty[e]
+            used = {cells[p] for p in peers[c]}
+            val = cells[c] + 1
+            while val in used:
+                val += 1
+
+            if val > self.n:
+                cells[c] = 0
+                e -= 1
+            else:
+                cells[c] = val
+                e += 1
+        self.set_rows(np.reshape(cells, (self.n, self.n)))
+        self.status = self.SOLVED
+        return self.status
 
     def __str__(self):
         return str(self.rows)